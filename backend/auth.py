@@ -0,0 +1,117 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Annotated
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+import httpx
+from pydantic import BaseModel
+import jwt
+from .config import settings
+
+bearer_scheme = HTTPBearer()
+
+class TokenData(BaseModel):
+    sub: str
+    name: str
+    picture: str
+
+class User(BaseModel):
+    sub: str
+    name: str
+    picture: str
+
+class TokenCache:
+    '''
+    Bounded LRU of verified access tokens, each entry kept until the token's `exp` claim.
+
+    Only accessed from the event loop, so no locking is needed.
+    '''
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, tuple[User, float]] = OrderedDict()
+
+    def get(self, token: str) -> User | None:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        user, exp = entry
+        if exp <= datetime.now(timezone.utc).timestamp():
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return user
+
+    def put(self, token: str, user: User, exp: float):
+        if self.maxsize <= 0:
+            return
+        self._entries[token] = (user, exp)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+token_cache = TokenCache(settings.access_token_cache_size)
+
+http_client: httpx.AsyncClient | None = None
+
+def open_http_client():
+    global http_client
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.google_token_timeout_seconds),
+            transport=httpx.AsyncHTTPTransport(retries=settings.google_token_retries), # retries connection failures only, an authorization code can only be redeemed once
+        )
+    return http_client
+
+async def close_http_client():
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+def verify_access_token(token: str):
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+    try:
+        payload = jwt.decode(token, settings.access_token_secret, algorithms=['HS256'], options={'require': ['exp']})
+        token_data = TokenData.model_validate(payload)
+    except:
+        raise HTTPException(status_code=401, detail='Could not validate credentials')
+    user = User(**token_data.model_dump())
+    token_cache.put(token, user, payload['exp'])
+    return user
+
+async def get_current_user(token: Annotated[HTTPAuthorizationCredentials, Depends(bearer_scheme)]):
+    return verify_access_token(token.credentials)
+
+def create_access_token(data: dict, expires_delta: timedelta | None = None):
+    to_encode = data.copy()
+    if expires_delta:
+        expire = datetime.now(timezone.utc) + expires_delta
+    else:
+        expire = datetime.now(timezone.utc) + timedelta(minutes=settings.access_token_expire_minutes)
+    to_encode.update({'exp': expire})
+    encoded_jwt = jwt.encode(to_encode, settings.access_token_secret, algorithm='HS256')
+    return encoded_jwt
+
+async def exchange_google_code(code: str):
+    # https://developers.google.com/identity/openid-connect/openid-connect#exchangecode
+    client = open_http_client()
+    try:
+        response = await client.post(settings.google_token_url, data={
+            'code': code,
+            'client_id': settings.google_client_id,
+            'client_secret': settings.google_client_secret,
+            'redirect_uri': f'{settings.frontend_url}/auth/google',
+            'grant_type': 'authorization_code',
+        })
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail='Timed out exchanging for token from Google')
+    except httpx.HTTPError:
+        raise HTTPException(status_code=502, detail='Failed to exchange for token from Google')
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail='Failed to exchange for token from Google')
+    return response.json().get('id_token')
@@ -7,9 +7,13 @@ class Settings(BaseSettings):
     google_client_secret: str = ''
     authorized_emails: list[str] = []
     authorized_hds: list[str] = []
+    google_token_url: str = 'https://oauth2.googleapis.com/token'
+    google_token_timeout_seconds: float = 10
+    google_token_retries: int = 2
 
     access_token_secret: str = ''
     access_token_expire_minutes: int = 60 * 24 * 7 # 7 days
+    access_token_cache_size: int = 256
 
     user_email_domains: list[str] = []
 
@@ -0,0 +1,325 @@
+'''
+Load test harness for the backend.
+
+Several simulated officers upload voting forms, calculate results and poll
+results at the same time, then throughput, latency percentiles, error rates
+and detected concurrency failures are reported.
+
+By default the app is run in-process in a temporary working directory, so no
+server, `.env` or Google credentials are needed:
+
+    python -m backend.load_test --concurrency 8 --duration 30
+
+To test a running server instead, pass `--base-url`. With `--auth mint` the
+harness signs tokens with `create_access_token`, so it needs the same
+`ACCESS_TOKEN_SECRET` as the server. With `--auth google` it logs in through
+`/api/auth/google` against a local stand-in for Google's token endpoint, so
+the server must be started with `GOOGLE_TOKEN_URL` set to the printed URL.
+'''
+import argparse
+import asyncio
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import hashlib
+import io
+import os
+import random
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from typing import Annotated
+from base64 import b64decode
+from fastapi import FastAPI, Form
+import httpx
+import jwt
+from matplotlib import image as mpimg
+import numpy as np
+from openpyxl import Workbook
+import uvicorn
+from .auth import close_http_client, create_access_token
+from .config import settings
+
+NODE_COLOR = np.array([0x1f, 0x78, 0xb4]) / 255 # networkx default node colour
+RANKING_QUESTIONS = {
+    'Chair': ['Alice', 'Bob', 'Carol'],
+    'Treasurer': ['Dan', 'Erin', 'Frank', 'Grace', 'Heidi'],
+}
+STALE_FORM_WARNING = 'Voting form has changed, results may be unexpected'
+# the generated forms are always valid, so these statuses can only come from reading a file another request is writing
+FILE_RACES = {
+    ('upload', 400): 'voting form file read while being overwritten',
+    ('calculate', 400): 'voting form file read while being overwritten',
+    ('calculate', 500): 'voting_form_details.json read while being written',
+    ('voting-form details', 500): 'voting_form_details.json read while being written',
+    ('poll results', 500): 'results.json read while being written',
+}
+
+def build_voting_form(num_responses: int, seed: int):
+    '''
+    Build an MS Forms style voting responses workbook.
+    '''
+    rng = random.Random(seed)
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['ID', 'Start time', 'Completion time', 'Email', 'Name', *RANKING_QUESTIONS, 'Motion'])
+    start = datetime(2025, 1, 1, 9)
+    for i in range(1, num_responses + 1):
+        started = start + timedelta(seconds=rng.randint(0, 3600))
+        rankings = []
+        for candidates in RANKING_QUESTIONS.values():
+            candidates = candidates.copy()
+            rng.shuffle(candidates)
+            rankings.append(''.join(f'{c};' for c in candidates))
+        ws.append([
+            i,
+            started,
+            started + timedelta(seconds=rng.randint(20, 600)),
+            f'voter{i}@example.com',
+            f'Voter {i}',
+            *rankings,
+            rng.choice(['For', 'Against', None]),
+        ])
+    f = io.BytesIO()
+    wb.save(f)
+    return f.getvalue()
+
+def start_stub_google(port: int):
+    '''
+    Serve a stand-in for Google's token endpoint. The authorization code is used as the email.
+    '''
+    stub = FastAPI()
+
+    @stub.post('/token')
+    def token(code: Annotated[str, Form()]):
+        claims = {'email': code, 'email_verified': True, 'name': code.split('@')[0], 'picture': ''}
+        return {'id_token': jwt.encode(claims, 'stub', algorithm='HS256')}
+
+    server = uvicorn.Server(uvicorn.Config(stub, host='127.0.0.1', port=port, log_level='warning'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f'http://127.0.0.1:{port}/token'
+
+@dataclass
+class Stats:
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    statuses: dict[str, Counter] = field(default_factory=lambda: defaultdict(Counter))
+    failures: Counter = field(default_factory=Counter)
+    notes: Counter = field(default_factory=Counter)
+
+    def record(self, op: str, status: int | str, elapsed: float):
+        self.latencies[op].append(elapsed)
+        self.statuses[op][status] += 1
+
+def is_error(status: int | str):
+    return status == 'transport' or status >= 400
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, forms: list[tuple[bytes, int]], stats: Stats):
+        self.client = client
+        self.forms = forms
+        self.form_rows = {hashlib.sha256(form).hexdigest(): num_rows for form, num_rows in forms}
+        self.stats = stats
+        self.node_area = None
+        self.checked = set() # calculated_at of results already checked, so each calculation is counted once
+
+    async def request(self, op: str, token: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers={'Authorization': f'Bearer {token}'}, **kwargs)
+        except httpx.HTTPError:
+            self.stats.record(op, 'transport', time.perf_counter() - start)
+            return None
+        self.stats.record(op, response.status_code, time.perf_counter() - start)
+        if (op, response.status_code) in FILE_RACES:
+            self.stats.failures[FILE_RACES[(op, response.status_code)]] += 1
+        return response
+
+    async def upload(self, token: str):
+        form, _ = random.choice(self.forms)
+        await self.request('upload', token, 'POST', '/api/admin/voting-form', files={'file': ('voting_form.xlsx', form)})
+
+    async def calculate(self, token: str):
+        details = await self.request('voting-form details', token, 'GET', '/api/admin/voting-form')
+        if details is None or details.status_code != 200:
+            return
+        details = details.json()
+        response = await self.request('calculate', token, 'POST', '/api/admin/calculate-results', json={
+            'voting_form_hash': details['file_sha256'],
+            'columns': details['columns'],
+        })
+        if response is None or response.status_code != 200:
+            return
+        body = response.json()
+        if STALE_FORM_WARNING in body['warnings']:
+            # another officer uploaded between reading the details and calculating, the server warns correctly
+            self.stats.notes['voting form replaced before calculation'] += 1
+        self.check_results(body['results'])
+
+    async def poll(self, token: str):
+        response = await self.request('poll results', token, 'GET', '/api/admin/results')
+        if response is not None and response.status_code == 200:
+            self.check_results(response.json())
+
+    def check_results(self, results: dict):
+        if results['calculated_at'] in self.checked:
+            return
+        self.checked.add(results['calculated_at'])
+        num_rows = self.form_rows.get(results['voting_form']['file_sha256'])
+        if num_rows is None or results['num_valid_responses'] != num_rows:
+            self.stats.failures['results mix two uploaded forms'] += 1
+        for column in results['rank_column_results']:
+            if column['lock_graph'] is None:
+                continue
+            if column['graph_url'] is None:
+                self.stats.failures['graph rendering failed'] += 1
+                continue
+            if self.node_area is None:
+                continue
+            num_nodes = len(column['lock_graph']['nodes'])
+            pixels = count_node_pixels(column['graph_url'])
+            if pixels < 0.5 * self.node_area or pixels > (num_nodes + 0.5) * self.node_area:
+                self.stats.failures['graph drawn on shared matplotlib figure'] += 1
+
+    async def calibrate(self, token: str):
+        '''
+        Run one upload and calculation alone to learn the rendered size of a graph node.
+        '''
+        form, _ = self.forms[0]
+        await self.client.post('/api/admin/voting-form', headers={'Authorization': f'Bearer {token}'}, files={'file': ('voting_form.xlsx', form)})
+        details = (await self.client.get('/api/admin/voting-form', headers={'Authorization': f'Bearer {token}'})).json()
+        response = await self.client.post('/api/admin/calculate-results', headers={'Authorization': f'Bearer {token}'}, json={
+            'voting_form_hash': details['file_sha256'],
+            'columns': details['columns'],
+        })
+        response.raise_for_status()
+        areas = []
+        for column in response.json()['results']['rank_column_results']:
+            if column['graph_url']:
+                areas.append(count_node_pixels(column['graph_url']) / len(column['lock_graph']['nodes']))
+        self.node_area = max(areas) if areas else None
+
+    async def officer(self, token: str, mix: dict[str, int], deadline: float):
+        ops = {'upload': self.upload, 'calculate': self.calculate, 'poll': self.poll}
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        while time.perf_counter() < deadline:
+            op = random.choices(names, weights)[0]
+            await ops[op](token)
+
+def count_node_pixels(graph_url: str):
+    img = mpimg.imread(io.BytesIO(b64decode(graph_url.split(',', 1)[1])), format='png')
+    return int(np.all(np.abs(img[..., :3] - NODE_COLOR) < 0.02, axis=-1).sum())
+
+def percentile(values: list[float], p: float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def print_report(stats: Stats, elapsed: float):
+    total = sum(len(v) for v in stats.latencies.values())
+    print(f'\n{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)\n')
+    print(f'{"operation":<22}{"count":>7}{"req/s":>8}{"errors":>8}{"p50 ms":>9}{"p90 ms":>9}{"p99 ms":>9}{"max ms":>9}')
+    for op, latencies in sorted(stats.latencies.items()):
+        errors = sum(count for status, count in stats.statuses[op].items() if is_error(status))
+        row = [percentile(latencies, p) * 1000 for p in (50, 90, 99, 100)]
+        print(f'{op:<22}{len(latencies):>7}{len(latencies) / elapsed:>8.1f}{errors / len(latencies):>8.1%}' + ''.join(f'{v:>9.0f}' for v in row))
+    print('\nstatus codes:')
+    for op, statuses in sorted(stats.statuses.items()):
+        print(f'  {op}: ' + ', '.join(f'{status} x{count}' for status, count in sorted(statuses.items(), key=lambda item: str(item[0]))))
+    print('\nconcurrency failures:')
+    if not stats.failures:
+        print('  none detected')
+    for failure, count in stats.failures.most_common():
+        print(f'  {failure}: {count}')
+    if stats.notes:
+        print('\nnotes (expected under concurrent uploads, not failures):')
+    for note, count in stats.notes.most_common():
+        print(f'  {note}: {count}')
+
+def parse_mix(value: str):
+    mix = {}
+    for part in value.split(','):
+        name, weight = part.split('=')
+        if name not in ('upload', 'calculate', 'poll'):
+            raise argparse.ArgumentTypeError(f'Unknown operation {name}')
+        mix[name] = int(weight)
+    return mix
+
+async def get_tokens(client: httpx.AsyncClient, auth: str, num_officers: int):
+    emails = [f'officer{i}@example.com' for i in range(num_officers)]
+    if auth == 'mint':
+        return [create_access_token({'sub': email, 'name': email.split('@')[0], 'picture': ''}) for email in emails]
+    tokens = []
+    for email in emails:
+        response = await client.post('/api/auth/google', json={'code': email})
+        response.raise_for_status()
+        tokens.append(response.json()['access_token'])
+    return tokens
+
+async def run(args: argparse.Namespace):
+    forms = [(build_voting_form(args.responses + i, seed=i), args.responses + i) for i in range(args.forms)]
+    stub = None
+    if args.auth == 'google':
+        stub, token_url = start_stub_google(args.stub_port)
+        print(f'Google token endpoint stand-in at {token_url}')
+
+    cwd = os.getcwd()
+    workdir = None
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+    else:
+        workdir = tempfile.TemporaryDirectory(prefix='voting-load-test-')
+        os.chdir(workdir.name)
+        os.makedirs('data')
+        settings.authorized_emails = []
+        settings.authorized_hds = []
+        if not settings.access_token_secret:
+            settings.access_token_secret = secrets.token_hex(32)
+        if stub is not None:
+            settings.google_token_url = token_url
+        from .main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url='http://load-test', timeout=args.timeout)
+
+    stats = Stats()
+    try:
+        tokens = await get_tokens(client, args.auth, args.concurrency)
+        load_test = LoadTest(client, forms, stats)
+        await load_test.calibrate(tokens[0])
+        print(f'Running {args.concurrency} officers for {args.duration}s with mix {args.mix}')
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(load_test.officer(token, args.mix, deadline) for token in tokens))
+        elapsed = time.perf_counter() - start
+    finally:
+        await client.aclose()
+        await close_http_client()
+        if stub is not None:
+            stub.should_exit = True
+        if workdir is not None:
+            os.chdir(cwd)
+            workdir.cleanup()
+
+    print_report(stats, elapsed)
+    errors = sum(count for statuses in stats.statuses.values() for status, count in statuses.items() if status == 'transport' or status >= 500)
+    return 1 if stats.failures or errors else 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the voting backend with concurrent officers.')
+    parser.add_argument('--base-url', help='URL of a running backend, the app is run in-process if omitted')
+    parser.add_argument('--auth', choices=['mint', 'google'], default='mint', help='mint tokens directly or log in through a stand-in Google token endpoint')
+    parser.add_argument('--stub-port', type=int, default=8765, help='port of the stand-in Google token endpoint')
+    parser.add_argument('--concurrency', type=int, default=8, help='number of concurrent officers')
+    parser.add_argument('--duration', type=float, default=20, help='seconds to run for')
+    parser.add_argument('--mix', type=parse_mix, default='upload=1,calculate=2,poll=7', help='relative weights of upload, calculate and poll')
+    parser.add_argument('--responses', type=int, default=200, help='number of responses in the generated voting form')
+    parser.add_argument('--forms', type=int, default=2, help='number of distinct voting forms uploaded, more than one is needed to detect mixed reads')
+    parser.add_argument('--timeout', type=float, default=60, help='request timeout in seconds')
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+if __name__ == '__main__':
+    main()
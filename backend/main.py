@@ -1,14 +1,14 @@
-from collections import Counter
-from datetime import datetime, timedelta, timezone
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 import hashlib
 from typing import Annotated
 from fastapi import Depends, FastAPI, File, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from urllib import parse
 import secrets
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-import requests
-from pydantic import BaseModel
+import threading
+from pydantic import BaseModel, ConfigDict
 import jwt
 import json
 import os
@@ -20,14 +20,21 @@ from matplotlib import pyplot as plt
 import matplotlib
 import io
 from base64 import b64encode
+import pandas as pd
 from .ms_form_calculate import calculate_ranking_result
+from .ms_form_analytics import MS_FORM_COLUMNS, build_metadata_frame, calculate_analytics
+from .auth import TokenData, User, close_http_client, create_access_token, exchange_google_code, get_current_user, open_http_client
 from .config import settings
 
 matplotlib.use('agg')
 
-bearer_scheme = HTTPBearer()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    open_http_client()
+    yield
+    await close_http_client()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     settings.frontend_url,
@@ -44,11 +51,6 @@ app.add_middleware(
 class GoogleAuthCallback(BaseModel):
     code: str
 
-class TokenData(BaseModel):
-    sub: str
-    name: str
-    picture: str
-
 class Column(BaseModel):
     name: str
     index: int
@@ -83,30 +85,19 @@ class Row(BaseModel):
     row_number: int
     row: tuple[str | int | float | datetime | None, ...]
 
-class User(BaseModel):
-    sub: str
-    name: str
-    picture: str
+class VotingForm(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
 
-def get_current_user(token: Annotated[HTTPAuthorizationCredentials, Depends(bearer_scheme)]):
-    try:
-        payload = jwt.decode(token.credentials, settings.access_token_secret, algorithms=['HS256'])
-        token_data = TokenData.model_validate(payload)
-    except:
-        raise HTTPException(status_code=401, detail='Could not validate credentials')
-    return User(**token_data.model_dump())
+    file_sha256: str
+    header: tuple[str | int | float | datetime | None, ...]
+    rows: list[Row]
+    metadata: pd.DataFrame | None = None # built on first use by get_voting_form_metadata
 
-def create_access_token(data: dict, expires_delta: timedelta | None = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
-    else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=settings.access_token_expire_minutes)
-    to_encode.update({'exp': expire})
-    encoded_jwt = jwt.encode(to_encode, settings.access_token_secret, algorithm='HS256')
-    return encoded_jwt
+VOTING_FORM_CACHE_SIZE = 4
+voting_form_cache: OrderedDict[str, VotingForm] = OrderedDict()
+voting_form_cache_lock = threading.Lock()
 
-def get_spreadsheet_worksheet(file_path: str):
+def get_spreadsheet_worksheet(file_path: str | io.BytesIO):
     wb = load_workbook(file_path)
     ws = wb.active or wb.worksheets[0]
     return ws
@@ -114,6 +105,39 @@ def get_spreadsheet_worksheet(file_path: str):
 def get_spreadsheet_num_rows(ws: Worksheet):
     return ws.max_row
 
+def cache_voting_form(file_sha256: str, ws: Worksheet):
+    '''
+    Parse the rows and metadata columns of a voting form once and keep them by file hash.
+    '''
+    rows = list(ws.iter_rows(values_only=True))
+    header = rows[0] if rows else ()
+    voting_form = VotingForm(
+        file_sha256=file_sha256,
+        header=header,
+        rows=[Row(row_number=i, row=row) for i, row in enumerate(rows[1:], start=2)],
+    )
+    with voting_form_cache_lock:
+        voting_form_cache[file_sha256] = voting_form
+        while len(voting_form_cache) > VOTING_FORM_CACHE_SIZE:
+            voting_form_cache.popitem(last=False)
+    return voting_form
+
+def load_voting_form(file_path: str):
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    file_sha256 = hashlib.sha256(content).hexdigest()
+    with voting_form_cache_lock:
+        voting_form = voting_form_cache.get(file_sha256)
+        if voting_form is not None:
+            voting_form_cache.move_to_end(file_sha256)
+            return voting_form
+    return cache_voting_form(file_sha256, get_spreadsheet_worksheet(io.BytesIO(content)))
+
+def get_voting_form_metadata(voting_form: VotingForm):
+    if voting_form.metadata is None:
+        voting_form.metadata = build_metadata_frame(voting_form.header, [row.row for row in voting_form.rows])
+    return voting_form.metadata
+
 def guess_is_ranking_column(ws: Worksheet, col_i: int):
     try:
         candidate_sets = Counter()
@@ -138,7 +162,6 @@ def guess_is_ranking_column(ws: Worksheet, col_i: int):
         return False
 
 def get_column_types(ws: Worksheet):
-    MS_FORM_COLUMNS = ['ID', 'Start time', 'Completion time', 'Email', 'Name', 'Last modified time']
     columns = {
         'default': [],
         'ranking': [],
@@ -160,16 +183,22 @@ def get_column_types(ws: Worksheet):
             columns['choice_single_answer'].append({'name': col_name, 'index': col_i})
     return columns
 
-def check_user_email_in_list(email: str, user_list: list[str]):
+def get_user_list_entry(email: str, user_list: set[str]):
+    '''
+    Get the user list entry matched by the email, or None if the email is not in the user list.
+    '''
     try:
         emailinfo = validate_email(email, check_deliverability=False)
-        if settings.user_email_domains and emailinfo.domain not in [d.lower() for d in settings.user_email_domains]:
-            return False
-        if emailinfo.local_part.lower() not in user_list:
-            return False
-        return True
     except:
-        return email.lower() in user_list
+        entry = email.lower()
+    else:
+        if settings.user_email_domains and emailinfo.domain not in [d.lower() for d in settings.user_email_domains]:
+            return None
+        entry = emailinfo.local_part.lower()
+    return entry if entry in user_list else None
+
+def check_user_email_in_list(email: str, user_list: set[str]):
+    return get_user_list_entry(email, user_list) is not None
 
 @app.get("/api/auth/google")
 def google_auth():
@@ -189,19 +218,8 @@ def google_auth():
     }
 
 @app.post("/api/auth/google")
-def google_auth_callback(data: GoogleAuthCallback):
-    # https://developers.google.com/identity/openid-connect/openid-connect#exchangecode
-    request = requests.post('https://oauth2.googleapis.com/token', data={
-        'code': data.code,
-        'client_id': settings.google_client_id,
-        'client_secret': settings.google_client_secret,
-        'redirect_uri': f'{settings.frontend_url}/auth/google',
-        'grant_type': 'authorization_code',
-    })
-    if request.status_code != 200:
-        raise HTTPException(status_code=request.status_code, detail='Failed to exchange for token from Google')
-
-    id_token = request.json().get('id_token')
+async def google_auth_callback(data: GoogleAuthCallback):
+    id_token = await exchange_google_code(data.code)
     claims = jwt.decode(id_token, options={'verify_signature': False}) # do not need to verify signature as it is directly from Google
 
     email = claims.get('email') # email may not be unique to a user and may be changed but it is fine for this use case
@@ -278,6 +296,10 @@ def upload_voting_form(
         raise HTTPException(status_code=400, detail='Error occurred, maybe file is not a valid .xlsx file')
     columns = get_column_types(ws)
     num_responses = get_spreadsheet_num_rows(ws) - 1
+    try:
+        cache_voting_form(file_hash, ws)
+    except:
+        pass # parsed again when calculating
     details = VotingFormDetails(
         filename=file.filename,
         file_sha256=file_hash,
@@ -319,7 +341,7 @@ def calculate_results(
     
     # load voting response and check hash
     try:
-        voting_form = get_spreadsheet_worksheet('data/voting_form.xlsx')
+        voting_form = load_voting_form('data/voting_form.xlsx')
     except:
         raise HTTPException(status_code=400, detail='Error occurred, could not open voting response file')
     with open('data/voting_form_details.json', 'r', encoding='utf8') as f:
@@ -334,24 +356,33 @@ def calculate_results(
             warnings.append('User list not found, skipping user list check')
         else:
             with open('data/user_list.txt', 'r', encoding='utf8') as f:
-                user_list = [line.strip().lower() for line in f if line.strip()]
+                user_list = set(line.strip().lower() for line in f if line.strip())
             with open('data/user_list_details.json', 'r', encoding='utf8') as f:
                 user_list_details = UserListDetails.model_validate(json.load(f))
             if user_list_details.file_sha256 != data.user_list_hash:
                 warnings.append('User list has changed')
 
-    responses = [Row(row_number=i, row=row) for i, row in enumerate(voting_form.iter_rows(values_only=True, min_row=2), start=2)]
+    responses = voting_form.rows
+    user_list_entries = None
     if user_list:
         email_col_i = None
-        for col_i in range(1, voting_form.max_column + 1):
-            col_name = voting_form.cell(row=1, column=col_i).value
+        for col_i, col_name in enumerate(voting_form.header, start=1):
             if col_name == 'Email':
                 email_col_i = col_i
                 break
         if email_col_i is None:
             warnings.append('Email column not found in voting form, skipping user list check')
         else:
-            responses = [row for row in responses if isinstance(row.row[email_col_i - 1], str) and check_user_email_in_list(str(row.row[email_col_i - 1]), user_list)]
+            # match each email once, the matches are reused by the analytics
+            email_entries = {}
+            user_list_entries = {}
+            for row in responses:
+                email = row.row[email_col_i - 1]
+                if isinstance(email, str):
+                    if email not in email_entries:
+                        email_entries[email] = get_user_list_entry(email, user_list)
+                    user_list_entries[row.row_number] = email_entries[email]
+            responses = [row for row in responses if user_list_entries.get(row.row_number) is not None]
 
     ranking_column_indices = [col.index for col in data.columns.ranking]
     choice_single_answer_column_indices = [col.index for col in data.columns.choice_single_answer]
@@ -403,7 +434,7 @@ def calculate_results(
                     pass
 
             result = {
-                'column_name': voting_form.cell(row=1, column=col_i).value,
+                'column_name': voting_form.header[col_i - 1],
                 'winners': winners,
                 'pairs': pairs,
                 'lock_graph': lock_graph_,
@@ -434,7 +465,7 @@ def calculate_results(
                     num_votes += 1
             counts = [{'choice': choice, 'count': count} for choice, count in counter.most_common()]
             result = {
-                'column_name': voting_form.cell(row=1, column=col_i).value,
+                'column_name': voting_form.header[col_i - 1],
                 'num_votes': num_votes,
                 'num_abstain': num_abstain,
                 'counts': counts,
@@ -443,6 +474,12 @@ def calculate_results(
         except:
             pass
     
+    analytics = None
+    try:
+        analytics = calculate_analytics(get_voting_form_metadata(voting_form), user_list, user_list_entries)
+    except:
+        warnings.append('Could not calculate response analytics, results are not affected')
+
     results = {
             'voting_form': {
                 'filename': voting_form_details.filename,
@@ -460,6 +497,7 @@ def calculate_results(
             'num_valid_responses': len(responses),
             'rank_column_results': ranking_column_results,
             'choice_column_results': choice_column_results,
+            'analytics': analytics,
             'calculated_at': datetime.now(timezone.utc).isoformat(),
             'requested_by': current_user.sub,
         }
@@ -0,0 +1,153 @@
+from datetime import datetime
+import pandas as pd
+
+MS_FORM_COLUMNS = ['ID', 'Start time', 'Completion time', 'Email', 'Name', 'Last modified time']
+DATETIME_COLUMNS = ['Start time', 'Completion time', 'Last modified time']
+DURATION_QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+def parse_naive_datetime(value):
+    '''
+    Parse a cell into a naive datetime, or None if it is not a datetime or has a timezone.
+    '''
+    if isinstance(value, str):
+        try:
+            value = pd.Timestamp(value.strip()).to_pydatetime()
+        except ValueError:
+            return None
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value
+    return None
+
+def has_timezone(value):
+    if isinstance(value, str):
+        try:
+            value = pd.Timestamp(value.strip())
+        except ValueError:
+            return False
+    return isinstance(value, datetime) and value.tzinfo is not None
+
+def build_metadata_frame(header: tuple, rows: list[tuple]) -> pd.DataFrame:
+    '''
+    Load the MS Forms metadata columns into a data frame indexed by spreadsheet row number.
+
+    Times with a timezone cannot be compared with the naive local times MS Forms exports, so they
+    are left out and their row numbers kept in `frame.attrs['timezone_aware_rows']`.
+    '''
+    columns = {}
+    for col_i, col_name in enumerate(header):
+        col_name = str(col_name).strip() if col_name else None
+        if col_name in MS_FORM_COLUMNS and col_name not in columns:
+            columns[col_name] = [row[col_i] for row in rows]
+    frame = pd.DataFrame(columns, index=pd.RangeIndex(2, len(rows) + 2, name='row_number'))
+    timezone_aware_rows = set()
+    for col_name in DATETIME_COLUMNS:
+        if col_name in frame:
+            values = frame[col_name]
+            timezone_aware_rows.update(values.index[values.map(has_timezone)])
+            frame[col_name] = pd.to_datetime(values.map(parse_naive_datetime), errors='coerce')
+    frame.attrs['timezone_aware_rows'] = timezone_aware_rows
+    if 'Email' in frame:
+        email = frame['Email'].astype('string').str.strip().str.lower()
+        frame['Email'] = email.mask(email == '')
+    return frame
+
+def get_turnout_interval(span: pd.Timedelta) -> str:
+    if span <= pd.Timedelta(hours=2):
+        return '5min'
+    if span <= pd.Timedelta(days=2):
+        return '1h'
+    return '1D'
+
+def get_turnout(frame: pd.DataFrame):
+    '''
+    Number of completed responses per time interval.
+    '''
+    if 'Completion time' not in frame:
+        return None
+    completion = frame['Completion time'].dropna().sort_values()
+    if len(completion) < 1:
+        return None
+    interval = get_turnout_interval(completion.iloc[-1] - completion.iloc[0])
+    counts = completion.dt.floor(interval).value_counts().sort_index() # non-empty intervals only
+    cumulative = counts.cumsum()
+    return {
+        'interval': interval,
+        'counts': [
+            {'time': time.isoformat(), 'count': int(count), 'cumulative': int(total)}
+            for time, count, total in zip(counts.index, counts, cumulative)
+        ],
+    }
+
+def get_duration_distribution(frame: pd.DataFrame):
+    '''
+    Distribution of the time taken to complete the form, in seconds.
+    '''
+    if 'Start time' not in frame or 'Completion time' not in frame:
+        return None
+    seconds = (frame['Completion time'] - frame['Start time']).dt.total_seconds().dropna()
+    num_negative = int((seconds < 0).sum())
+    seconds = seconds[seconds >= 0]
+    if len(seconds) < 1:
+        return None
+    quantiles = seconds.quantile(DURATION_QUANTILES)
+    return {
+        'num_responses': len(seconds),
+        'num_negative_excluded': num_negative,
+        'min': float(seconds.min()),
+        'mean': float(seconds.mean()),
+        'max': float(seconds.max()),
+        'quantiles': [{'quantile': q, 'seconds': float(v)} for q, v in zip(DURATION_QUANTILES, quantiles)],
+    }
+
+def get_multiple_submissions(frame: pd.DataFrame):
+    '''
+    Emails with more than one response, with the row numbers of their responses.
+    '''
+    if 'Email' not in frame:
+        return None
+    email = frame['Email'].dropna()
+    row_numbers = email.index.to_series().groupby(email.values)
+    sizes = row_numbers.size()
+    multiple = sizes[sizes > 1].sort_values(ascending=False, kind='stable')
+    rows = row_numbers.agg(list)
+    return {
+        'num_unique_emails': len(sizes),
+        'num_emails_with_multiple_submissions': len(multiple),
+        'emails': [
+            {'email': email_, 'count': int(count), 'rows': [int(row_number) for row_number in rows[email_]]}
+            for email_, count in multiple.items()
+        ],
+    }
+
+def get_eligibility(frame: pd.DataFrame, user_list: set[str], user_list_entries: dict[int, str | None]):
+    '''
+    Entries in the user list against the user list entries matched by responses.
+
+    user_list_entries: user list entry matched by each row number, as found when filtering responses
+    '''
+    if 'Email' not in frame:
+        return None
+    entries = pd.Series(user_list_entries, dtype='string').reindex(frame.index)
+    num_voted = entries.nunique()
+    num_eligible = len(user_list)
+    return {
+        'num_eligible': num_eligible,
+        'num_voted': num_voted,
+        'num_not_eligible': frame['Email'][entries.isna()].nunique(),
+        'turnout_ratio': num_voted / num_eligible if num_eligible else None,
+    }
+
+def calculate_analytics(frame: pd.DataFrame, user_list: set[str] | None = None, user_list_entries: dict[int, str | None] | None = None):
+    '''
+    Analytics over all responses, including responses from emails not in the user list.
+    '''
+    num_modified = int(frame['Last modified time'].notna().sum()) if 'Last modified time' in frame else None
+    return {
+        'num_responses': len(frame),
+        'num_modified_responses': num_modified,
+        'num_timezone_aware_responses': len(frame.attrs.get('timezone_aware_rows', ())),
+        'turnout': get_turnout(frame),
+        'duration': get_duration_distribution(frame),
+        'multiple_submissions': get_multiple_submissions(frame),
+        'eligibility': get_eligibility(frame, user_list, user_list_entries) if user_list and user_list_entries is not None else None,
+    }
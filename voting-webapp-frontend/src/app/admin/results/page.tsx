@@ -8,6 +8,11 @@ import { Accordion, Alert, Anchor, Button, Card, Group, Image, Table, Text, Titl
 import { IconAlertTriangle } from "@tabler/icons-react";
 import { useContext, useEffect, useState } from "react";
 
+const formatSeconds = (seconds: number) => {
+  const minutes = Math.floor(seconds / 60);
+  return minutes > 0 ? `${minutes}m ${Math.round(seconds % 60)}s` : `${Math.round(seconds)}s`;
+}
+
 export default function Results() {
   const [user] = useContext(UserContext);
   const [votingResults, setVotingResults] = useState<VotingResults | null>(null);
@@ -260,6 +265,116 @@ export default function Results() {
     </Accordion.Item>
   ));
 
+  const analytics = votingResults && votingResults.analytics;
+  const analyticsSection = analytics ? (
+    <>
+      <Title order={2} mt='md'>Response analytics</Title>
+      <Text mt='xs'>Covers all {analytics.num_responses} responses, including responses from users not in the users list.</Text>
+      <Card withBorder mt='md'>
+        <Table variant="vertical">
+          <Table.Tbody>
+            {analytics.eligibility && (
+              <>
+                <Table.Tr>
+                  <Table.Td>Eligible users in users list</Table.Td>
+                  <Table.Td>{analytics.eligibility.num_eligible}</Table.Td>
+                </Table.Tr>
+                <Table.Tr>
+                  <Table.Td>Eligible users who responded</Table.Td>
+                  <Table.Td>{analytics.eligibility.num_voted}{analytics.eligibility.turnout_ratio !== null && ` (${(analytics.eligibility.turnout_ratio * 100).toFixed(1)}%)`}</Table.Td>
+                </Table.Tr>
+                <Table.Tr>
+                  <Table.Td>Emails not in users list</Table.Td>
+                  <Table.Td>{analytics.eligibility.num_not_eligible}</Table.Td>
+                </Table.Tr>
+              </>
+            )}
+            {analytics.multiple_submissions && (
+              <Table.Tr>
+                <Table.Td>Emails with multiple responses</Table.Td>
+                <Table.Td className={analytics.multiple_submissions.num_emails_with_multiple_submissions !== 0 ? 'text-red-500 font-bold' : ''}>{analytics.multiple_submissions.num_emails_with_multiple_submissions}</Table.Td>
+              </Table.Tr>
+            )}
+            {analytics.num_modified_responses !== null && (
+              <Table.Tr>
+                <Table.Td>Modified responses</Table.Td>
+                <Table.Td>{analytics.num_modified_responses}</Table.Td>
+              </Table.Tr>
+            )}
+            {analytics.duration && (
+              <Table.Tr>
+                <Table.Td>Time to complete</Table.Td>
+                <Table.Td>
+                  Min {formatSeconds(analytics.duration.min)}
+                  {analytics.duration.quantiles.map((q) => ` | P${Math.round(q.quantile * 100)} ${formatSeconds(q.seconds)}`).join('')}
+                  {' | '}Max {formatSeconds(analytics.duration.max)}
+                </Table.Td>
+              </Table.Tr>
+            )}
+            {analytics.duration && analytics.duration.num_negative_excluded > 0 && (
+              <Table.Tr>
+                <Table.Td>Responses completed before started, excluded from time to complete</Table.Td>
+                <Table.Td className='text-red-500 font-bold'>{analytics.duration.num_negative_excluded}</Table.Td>
+              </Table.Tr>
+            )}
+            {analytics.num_timezone_aware_responses > 0 && (
+              <Table.Tr>
+                <Table.Td>Responses with times in a timezone, excluded from turnout and time to complete</Table.Td>
+                <Table.Td className='text-red-500 font-bold'>{analytics.num_timezone_aware_responses}</Table.Td>
+              </Table.Tr>
+            )}
+          </Table.Tbody>
+        </Table>
+      </Card>
+      {analytics.multiple_submissions && analytics.multiple_submissions.emails.length > 0 && (
+        <Card withBorder mt='md'>
+          <Text fw={700}>Emails with multiple responses</Text>
+          <Table>
+            <Table.Thead>
+              <Table.Tr>
+                <Table.Th>Email</Table.Th>
+                <Table.Th>Responses</Table.Th>
+                <Table.Th>Rows</Table.Th>
+              </Table.Tr>
+            </Table.Thead>
+            <Table.Tbody>
+              {analytics.multiple_submissions.emails.map((email, index) => (
+                <Table.Tr key={index}>
+                  <Table.Td>{email.email}</Table.Td>
+                  <Table.Td>{email.count}</Table.Td>
+                  <Table.Td>{email.rows.join(', ')}</Table.Td>
+                </Table.Tr>
+              ))}
+            </Table.Tbody>
+          </Table>
+        </Card>
+      )}
+      {analytics.turnout && (
+        <Card withBorder mt='md'>
+          <Text fw={700}>Responses completed per {analytics.turnout.interval}</Text>
+          <Table>
+            <Table.Thead>
+              <Table.Tr>
+                <Table.Th>From</Table.Th>
+                <Table.Th>Responses</Table.Th>
+                <Table.Th>Total</Table.Th>
+              </Table.Tr>
+            </Table.Thead>
+            <Table.Tbody>
+              {analytics.turnout.counts.map((count, index) => (
+                <Table.Tr key={index}>
+                  <Table.Td>{count.time}</Table.Td>
+                  <Table.Td>{count.count}</Table.Td>
+                  <Table.Td>{count.cumulative}</Table.Td>
+                </Table.Tr>
+              ))}
+            </Table.Tbody>
+          </Table>
+        </Card>
+      )}
+    </>
+  ) : null;
+
   if (!votingResults) {
     return (
       <>
@@ -281,6 +396,7 @@ export default function Results() {
         {rankedColumnResults}
         {choiceColumnResults}
       </Accordion>
+      {analyticsSection}
     </>
   )
 }
@@ -38,6 +38,35 @@ interface ChoiceColumnResult {
   counts: { choice: string, count: number }[];
 }
 
+interface Analytics {
+  num_responses: number;
+  num_modified_responses: number | null;
+  num_timezone_aware_responses: number;
+  turnout: {
+    interval: string;
+    counts: { time: string, count: number, cumulative: number }[];
+  } | null;
+  duration: {
+    num_responses: number;
+    num_negative_excluded: number;
+    min: number;
+    mean: number;
+    max: number;
+    quantiles: { quantile: number, seconds: number }[];
+  } | null;
+  multiple_submissions: {
+    num_unique_emails: number;
+    num_emails_with_multiple_submissions: number;
+    emails: { email: string, count: number, rows: number[] }[];
+  } | null;
+  eligibility: {
+    num_eligible: number;
+    num_voted: number;
+    num_not_eligible: number;
+    turnout_ratio: number | null;
+  } | null;
+}
+
 export interface VotingResults {
   num_responses: number;
   num_valid_responses: number;
@@ -45,6 +74,7 @@ export interface VotingResults {
   user_list: VotingResultsUserListDetails | null;
   rank_column_results: RankColumnResult[];
   choice_column_results: ChoiceColumnResult[];
+  analytics?: Analytics | null;
   warnings: string[];
   calculated_at: string;
   requested_by: string;